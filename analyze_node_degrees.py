@@ -10,115 +10,52 @@ Date: 2025-03-21
 
 import os
 import pandas as pd
-import networkx as nx
+
+from pipeline import TARGET_NODES, DAYS_OF_WEEK, HOURS, load_route_stats, get_block_positions
 
 
 # ========== CONFIGURATION ========== #
 
 # Input file path
-TAXI_BLOCKS_CSV = "data/pickup_dropoff_blocks.csv"
+TAXI_BLOCKS_PARQUET = "output/pickup_dropoff_blocks.parquet"
 
 # Output file path
 DEGREES_CSV = "output/degrees.csv"
 
-# Parameters
-TARGET_NODES = ['10113001008', '10076001001', '10143001021']  # Times Square, Empire State, MET
-DAYS_OF_WEEK = ['Monday', 'Saturday']
-HOURS = list(range(10, 22))  # 10 AM – 9 PM
-
 
 # ========== MAIN FUNCTIONS ========== #
 
-def load_data():
-    """Load and preprocess taxi trip data."""
-    print("Loading taxi trip data...")
-    df = pd.read_csv(TAXI_BLOCKS_CSV)
-    df['tpep_pickup_datetime'] = pd.to_datetime(df['tpep_pickup_datetime'], errors='coerce')
-    df['tpep_dropoff_datetime'] = pd.to_datetime(df['tpep_dropoff_datetime'], errors='coerce')
-
-    # Format block IDs
-    for col in ['BCTCB2010_x', 'BCTCB2010_y']:
-        df[col] = df[col].apply(
-            lambda x: str(int(x)) if isinstance(x, float) and x.is_integer() else str(x)
-        ).str.strip()
-
-    # Calculate travel time (minutes)
-    df['travel_time'] = (df['tpep_dropoff_datetime'] - df['tpep_pickup_datetime']).dt.total_seconds() / 60.0
-    df['pickup_hour'] = df['tpep_pickup_datetime'].dt.hour
-    df['pickup_day'] = df['tpep_pickup_datetime'].dt.day_name()
-    return df
-
-
-def compute_mean_coords(df):
-    """Compute mean latitude/longitude for each block."""
-    combined_coords = pd.concat([
-        df[['BCTCB2010_x', 'pickup_latitude', 'pickup_longitude']]
-        .rename(columns={'BCTCB2010_x': 'BCTCB2010', 'pickup_latitude': 'latitude', 'pickup_longitude': 'longitude'}),
-        df[['BCTCB2010_y', 'dropoff_latitude', 'dropoff_longitude']]
-        .rename(columns={'BCTCB2010_y': 'BCTCB2010', 'dropoff_latitude': 'latitude', 'dropoff_longitude': 'longitude'})
-    ])
-    return combined_coords.groupby('BCTCB2010').agg(
-        mean_latitude=('latitude', 'mean'),
-        mean_longitude=('longitude', 'mean')
-    ).reset_index()
-
-
-def build_graphs(df, mean_coords):
-    """Build taxi route graphs grouped by hour and weekday."""
-    # Merge mean coordinates
-    df = df.merge(mean_coords, left_on='BCTCB2010_x', right_on='BCTCB2010', how='left').drop(columns=['BCTCB2010'])
-    df = df.merge(mean_coords, left_on='BCTCB2010_y', right_on='BCTCB2010', how='left', suffixes=('_x', '_y')).drop(columns=['BCTCB2010'])
-
-    # Route stats
-    route_stats = df.groupby(['pickup_hour', 'pickup_day', 'BCTCB2010_x', 'BCTCB2010_y']).agg(
-        avg_travel_time=('travel_time', 'mean'),
-        trip_count=('BCTCB2010_x', 'count')
-    ).reset_index()
-
-    # Unique block positions
-    unique_blocks = pd.concat([
-        df[['BCTCB2010_x', 'mean_latitude_x', 'mean_longitude_x']]
-        .rename(columns={'BCTCB2010_x': 'block_id', 'mean_latitude_x': 'lat', 'mean_longitude_x': 'lng'}),
-        df[['BCTCB2010_y', 'mean_latitude_y', 'mean_longitude_y']]
-        .rename(columns={'BCTCB2010_y': 'block_id', 'mean_latitude_y': 'lat', 'mean_longitude_y': 'lng'})
-    ]).drop_duplicates()
-    block_positions = {row['block_id']: (row['lng'], row['lat']) for _, row in unique_blocks.iterrows()}
-
-    return route_stats, block_positions
-
-
 def compute_node_degrees(route_stats, block_positions):
     """Compute node degrees for target nodes across hours and days."""
-    node_degrees = []
-
-    for hour in HOURS:
-        for day in DAYS_OF_WEEK:
-            filtered = route_stats[(route_stats['pickup_hour'] == hour) & (route_stats['pickup_day'] == day)]
-            G = nx.Graph()
+    keys = ['pickup_hour', 'pickup_day']
+    stats = route_stats[route_stats['pickup_hour'].isin(HOURS) & route_stats['pickup_day'].isin(DAYS_OF_WEEK)]
 
-            for block_id, (lng, lat) in block_positions.items():
-                G.add_node(block_id, pos=(lng, lat))
+    # View each route from both ends so an undirected neighbour is counted once per node
+    ends = pd.concat([
+        stats[keys + ['BCTCB2010_x', 'BCTCB2010_y']].set_axis(keys + ['node', 'neighbor'], axis=1),
+        stats[keys + ['BCTCB2010_y', 'BCTCB2010_x']].set_axis(keys + ['node', 'neighbor'], axis=1)
+    ])
+    ends = ends[ends['node'].isin(TARGET_NODES)].drop_duplicates()
 
-            for _, row in filtered.iterrows():
-                G.add_edge(row['BCTCB2010_x'], row['BCTCB2010_y'], weight=row['avg_travel_time'])
+    # Degree is the number of unique neighbours; a self-loop counts twice
+    degrees = ends.groupby(keys + ['node']).size()
+    self_loops = ends[ends['node'] == ends['neighbor']].groupby(keys + ['node']).size()
+    degrees = degrees.add(self_loops, fill_value=0)
 
-            for node in TARGET_NODES:
-                if node in G:
-                    node_degrees.append({
-                        'graph': f"{hour}_{day}",
-                        'node': node,
-                        'degree': G.degree(node)
-                    })
+    # Every block is a node of each hourly graph, so targets with no routes have degree 0
+    nodes = [node for node in TARGET_NODES if node in block_positions]
+    index = pd.MultiIndex.from_product([HOURS, DAYS_OF_WEEK, nodes], names=keys + ['node'])
+    node_degrees = degrees.reindex(index, fill_value=0).astype(int).reset_index(name='degree')
+    node_degrees['graph'] = node_degrees['pickup_hour'].astype(str) + '_' + node_degrees['pickup_day']
 
-    return pd.DataFrame(node_degrees)
+    return node_degrees[['graph', 'node', 'degree']]
 
 
 # ========== MAIN ========== #
 
 def main():
-    df = load_data()
-    mean_coords = compute_mean_coords(df)
-    route_stats, block_positions = build_graphs(df, mean_coords)
+    route_stats, mean_coords = load_route_stats(TAXI_BLOCKS_PARQUET)
+    block_positions = get_block_positions(mean_coords)
     degrees_df = compute_node_degrees(route_stats, block_positions)
 
     # Save results
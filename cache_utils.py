@@ -0,0 +1,48 @@
+"""
+cache_utils.py
+
+Parquet cache paths for preprocessed tables. Each entry is keyed by its
+source file's path, size and modification time, and older entries for the
+same source are removed when a new one is written.
+
+Author: eknar31
+Date: 2026-10-15
+"""
+
+import os
+import re
+import hashlib
+
+
+# ========== CONFIGURATION ========== #
+
+CACHE_DIR = "output/cache"
+
+
+# ========== HELPERS ========== #
+
+def cache_key(path):
+    """Short hash of a file's path, size and modification time."""
+    stat = os.stat(path)
+    return hashlib.sha1(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+
+
+def _cache_prefix(name, source):
+    """Cache file prefix for a table built from a source file."""
+    return f"{name}_{os.path.splitext(os.path.basename(source))[0]}"
+
+
+# ========== MAIN FUNCTIONS ========== #
+
+def cache_path(name, source):
+    """Return the cache file for table `name` built from the current version of `source`."""
+    return os.path.join(CACHE_DIR, f"{_cache_prefix(name, source)}_{cache_key(source)}.parquet")
+
+
+def remove_stale(name, source):
+    """Delete cache files for table `name` built from older versions of `source`."""
+    current = os.path.basename(cache_path(name, source))
+    pattern = re.compile(re.escape(_cache_prefix(name, source)) + r"_[0-9a-f]{12}\.parquet")
+    for filename in os.listdir(CACHE_DIR):
+        if filename != current and pattern.fullmatch(filename):
+            os.remove(os.path.join(CACHE_DIR, filename))
@@ -14,12 +14,22 @@ import os
 # ========== CONFIGURATION ========== #
 
 # Input file paths 
-PICKUP_CSV = "data/pickup_blocks.csv"
-DROPOFF_CSV = "data/dropoff_blocks.csv"
+PICKUP_PARQUET = "data/pickup_blocks.parquet"
+DROPOFF_PARQUET = "data/dropoff_blocks.parquet"
 
 #Output file paths
-MERGED_CSV = "output/pickup_dropoff_blocks.csv"
-MANHATTAN_ONLY_CSV = "output/manhattan_taxi_blocks.csv"
+MERGED_PARQUET = "output/pickup_dropoff_blocks.parquet"
+MANHATTAN_ONLY_PARQUET = "output/manhattan_taxi_blocks.parquet"
+
+# Columns needed from each side of the trip
+PICKUP_COLUMNS = [
+    'event_id', 'tpep_pickup_datetime', 'pickup_longitude', 'pickup_latitude',
+    'BCTCB2010', 'BoroName'
+]
+DROPOFF_COLUMNS = [
+    'event_id', 'tpep_dropoff_datetime', 'dropoff_longitude', 'dropoff_latitude',
+    'BCTCB2010', 'BoroName'
+]
 
 
 # ========== MAIN FUNCTION ========== #
@@ -27,8 +37,8 @@ MANHATTAN_ONLY_CSV = "output/manhattan_taxi_blocks.csv"
 def main():
     print("Loading pickup and dropoff data...")
 
-    pickup_blocks = pd.read_csv(PICKUP_CSV, parse_dates=['tpep_pickup_datetime'])
-    dropoff_blocks = pd.read_csv(DROPOFF_CSV, parse_dates=['tpep_dropoff_datetime'])
+    pickup_blocks = pd.read_parquet(PICKUP_PARQUET, columns=PICKUP_COLUMNS)
+    dropoff_blocks = pd.read_parquet(DROPOFF_PARQUET, columns=DROPOFF_COLUMNS)
 
     # Merge on event_id
     merged_blocks = pd.merge(
@@ -43,7 +53,7 @@ def main():
 
     # Save full merged data
     os.makedirs("output", exist_ok=True)
-    merged_blocks.to_csv(MERGED_CSV, index=False)
+    merged_blocks.to_parquet(MERGED_PARQUET, index=False)
 
     # Filter for Manhattan-to-Manhattan trips
     manhattan_blocks = merged_blocks[
@@ -63,7 +73,7 @@ def main():
     ]]
 
     # Save Manhattan-only dataset
-    manhattan_blocks.to_csv(MANHATTAN_ONLY_CSV, index=False)
+    manhattan_blocks.to_parquet(MANHATTAN_ONLY_PARQUET, index=False)
 
     print("Filtered data saved!")
 
@@ -0,0 +1,205 @@
+"""
+pipeline.py
+
+Shared preprocessing for the route analyses: loads block-labelled taxi trips,
+aggregates block-to-block travel times by hour and weekday, and precomputes
+landmark-to-landmark shortest travel times.
+
+Author: eknar31
+Date: 2026-10-15
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import networkx as nx
+from numba import njit, prange, get_num_threads
+from joblib import Parallel, delayed
+
+from cache_utils import CACHE_DIR, cache_path, remove_stale
+
+
+# ========== CONFIGURATION ========== #
+
+# Columns read from the trip data
+TAXI_COLUMNS = [
+    'tpep_pickup_datetime', 'tpep_dropoff_datetime',
+    'BCTCB2010_x', 'BCTCB2010_y',
+    'pickup_latitude', 'pickup_longitude',
+    'dropoff_latitude', 'dropoff_longitude'
+]
+
+# Parameters
+TARGET_NODES = ['10113001008', '10076001001', '10143001021']  # Times Square, Empire State, MET
+DAYS_OF_WEEK = ['Monday', 'Saturday']
+HOURS = list(range(10, 22))  # 10 AM – 9 PM
+WEEKDAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+# NetworkX dispatch backend for shortest paths ("cugraph", "graphblas", ...); None runs pure Python
+GRAPH_BACKEND = None
+
+
+# ========== HELPERS ========== #
+
+@njit(parallel=True, cache=True)
+def group_mean(codes, lat, lng, k, n_threads):
+    """Mean latitude/longitude per group code, summed in per-thread buffers."""
+    step = (codes.size + n_threads - 1) // n_threads
+    sum_lat = np.zeros((n_threads, k))
+    sum_lng = np.zeros((n_threads, k))
+    count = np.zeros((n_threads, k), dtype=np.int64)
+
+    for t in prange(n_threads):
+        for i in range(t * step, min((t + 1) * step, codes.size)):
+            c = codes[i]
+            sum_lat[t, c] += lat[i]
+            sum_lng[t, c] += lng[i]
+            count[t, c] += 1
+
+    total = count.sum(axis=0)
+    return sum_lat.sum(axis=0) / total, sum_lng.sum(axis=0) / total
+
+
+def _make_graph(edges):
+    """Build one hourly travel time graph from its route edges."""
+    G = nx.Graph()
+    G.add_weighted_edges_from(zip(
+        edges['BCTCB2010_x'].to_numpy(),
+        edges['BCTCB2010_y'].to_numpy(),
+        edges['avg_travel_time'].to_numpy()
+    ))
+    return G
+
+
+def _landmark_distances(edges):
+    """Return landmark-to-landmark travel times for one hourly graph."""
+    G = _make_graph(edges)
+
+    dist = np.full((len(TARGET_NODES), len(TARGET_NODES)), np.inf)
+    for src_idx, src in enumerate(TARGET_NODES):
+        if src not in G:
+            continue
+        lengths = nx.single_source_dijkstra_path_length(G, src, weight='weight', backend=GRAPH_BACKEND)
+        for dst_idx, dst in enumerate(TARGET_NODES):
+            dist[src_idx, dst_idx] = lengths.get(dst, np.inf)
+    return dist
+
+
+# ========== MAIN FUNCTIONS ========== #
+
+def load_taxi_frame(path):
+    """Load and preprocess taxi trip data."""
+    print("Loading taxi trip data...")
+    df = pd.read_parquet(path, columns=TAXI_COLUMNS)
+
+    # Format block IDs
+    block_cols = ['BCTCB2010_x', 'BCTCB2010_y']
+    df[block_cols] = df[block_cols].astype('string').apply(lambda s: s.str.strip())
+
+    # Calculate travel time (minutes), pickup hour and weekday on the raw datetime64 arrays
+    pickup = df['tpep_pickup_datetime'].to_numpy()
+    dropoff = df['tpep_dropoff_datetime'].to_numpy()
+    df['travel_time'] = (dropoff - pickup) / np.timedelta64(1, 'm')
+    df['pickup_hour'] = pickup.astype('datetime64[h]').astype(np.int64) % 24
+    df['pickup_day'] = WEEKDAY_NAMES[(pickup.astype('datetime64[D]').astype(np.int64) + 3) % 7]  # 1970-01-01 was a Thursday
+    return df
+
+
+def compute_mean_coords(df):
+    """Compute mean latitude/longitude for each block."""
+    # Stack pickup and dropoff ends as flat arrays instead of a concatenated DataFrame
+    ids = np.concatenate([df['BCTCB2010_x'].to_numpy(), df['BCTCB2010_y'].to_numpy()])
+    lat = np.concatenate([df['pickup_latitude'].to_numpy(), df['dropoff_latitude'].to_numpy()])
+    lng = np.concatenate([df['pickup_longitude'].to_numpy(), df['dropoff_longitude'].to_numpy()])
+
+    # Group by block code (missing blocks are coded -1 and dropped)
+    codes, uniques = pd.factorize(ids, sort=True)
+    valid = codes >= 0
+    codes, lat, lng = codes[valid], lat[valid], lng[valid]
+
+    mean_lat, mean_lng = group_mean(codes, lat, lng, len(uniques), get_num_threads())
+    return pd.DataFrame({
+        'BCTCB2010': uniques,
+        'mean_latitude': mean_lat,
+        'mean_longitude': mean_lng
+    })
+
+
+def build_route_stats(df):
+    """Aggregate average travel time and trip count per route, hour and weekday."""
+    # Route stats: fold the four group keys into one integer code per trip
+    keys = ['pickup_hour', 'pickup_day', 'BCTCB2010_x', 'BCTCB2010_y']
+    factorized = [pd.factorize(df[col], sort=True) for col in keys]
+    valid = np.logical_and.reduce([codes >= 0 for codes, _ in factorized])
+    combined = np.zeros(valid.sum(), dtype=np.int64)
+    for codes, uniques in factorized:
+        combined = combined * len(uniques) + codes[valid]
+
+    # Compact to the groups that occur, then sum and count with bincount
+    group_codes, groups = pd.factorize(combined, sort=True)
+    sums = np.bincount(group_codes, weights=df['travel_time'].to_numpy()[valid])
+    counts = np.bincount(group_codes)
+
+    # Unwrap the combined code back into the key columns
+    key_values = {}
+    for col, (_, uniques) in zip(reversed(keys), reversed(factorized)):
+        groups, idx = np.divmod(groups, len(uniques))
+        key_values[col] = uniques.take(idx)
+    route_stats = pd.DataFrame({col: key_values[col] for col in keys})
+    route_stats['avg_travel_time'] = sums / counts
+    route_stats['trip_count'] = counts
+    return route_stats
+
+
+def get_block_positions(mean_coords):
+    """Map each block to its (lng, lat) position (mean_coords has one row per block)."""
+    return dict(zip(
+        mean_coords['BCTCB2010'],
+        zip(mean_coords['mean_longitude'], mean_coords['mean_latitude'])
+    ))
+
+
+def load_route_stats(path):
+    """Load route stats and block mean coordinates for a trip file, reusing the Parquet cache when fresh."""
+    route_stats_path = cache_path("route_stats", path)
+    mean_coords_path = cache_path("mean_coords", path)
+
+    if os.path.exists(route_stats_path) and os.path.exists(mean_coords_path):
+        print("Loading cached route stats...")
+        return pd.read_parquet(route_stats_path), pd.read_parquet(mean_coords_path)
+
+    df = load_taxi_frame(path)
+    mean_coords = compute_mean_coords(df)
+    route_stats = build_route_stats(df)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    route_stats.to_parquet(route_stats_path, index=False)
+    mean_coords.to_parquet(mean_coords_path, index=False)
+    remove_stale("route_stats", path)
+    remove_stale("mean_coords", path)
+    return route_stats, mean_coords
+
+
+def compute_landmark_distances(route_stats):
+    """Precompute shortest travel times between landmarks for every hour and day.
+
+    Returns an array indexed by [hour, day, from_landmark, to_landmark], with
+    days and landmarks ordered as in DAYS_OF_WEEK and TARGET_NODES. Hours
+    without routes and unreachable landmarks are left as infinity.
+    """
+    dist = np.full((24, len(DAYS_OF_WEEK), len(TARGET_NODES), len(TARGET_NODES)), np.inf)
+
+    # Each (hour, day) graph is independent; ship only its edge columns to the workers
+    stats = route_stats[route_stats['pickup_hour'].isin(HOURS) & route_stats['pickup_day'].isin(DAYS_OF_WEEK)]
+    groups = {
+        key: sub[['BCTCB2010_x', 'BCTCB2010_y', 'avg_travel_time']]
+        for key, sub in stats.groupby(['pickup_hour', 'pickup_day'], sort=False)
+    }
+    results = Parallel(n_jobs=-1, backend='loky')(
+        delayed(_landmark_distances)(edges) for edges in groups.values()
+    )
+
+    for (hour, day), landmark_dist in zip(groups, results):
+        dist[hour, DAYS_OF_WEEK.index(day)] = landmark_dist
+
+    return dist
@@ -9,7 +9,11 @@ Author: eknar31
 Date: 2025-03-21
 """
 
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import geopandas as gpd
 from shapely.geometry import Point
 
@@ -19,92 +23,156 @@ from shapely.geometry import Point
 TAXI_DATA_PATH = "data/yellow_tripdata_2015-01.csv"
 BLOCKS_SHP_PATH = "data/nycb2010_25a/nycb2010.shp"
 
+# Columnar copy of the raw taxi data (created on first run)
+TAXI_PARQUET_PATH = "data/yellow_tripdata_2015-01.parquet"
+
 # Output file paths
 PICKUP_OUTPUT = "data/pickup_blocks.csv"
 DROPOFF_OUTPUT = "data/dropoff_blocks.csv"
+PICKUP_PARQUET = "data/pickup_blocks.parquet"
+DROPOFF_PARQUET = "data/dropoff_blocks.parquet"
+
+# Taxi columns used by the pipeline
+TAXI_COLUMNS = [
+    'pickup_longitude', 'pickup_latitude',
+    'dropoff_longitude', 'dropoff_latitude',
+    'tpep_pickup_datetime', 'tpep_dropoff_datetime'
+]
+DATE_COLUMNS = ['tpep_pickup_datetime', 'tpep_dropoff_datetime']
+
+# Coordinates are stored as float32 (< 1 m resolution here, well below taxi GPS error)
+COORD_DTYPES = {
+    'pickup_longitude': 'float32', 'pickup_latitude': 'float32',
+    'dropoff_longitude': 'float32', 'dropoff_latitude': 'float32'
+}
+
+# Rows parsed/filtered at a time
+CHUNK_SIZE = 1_000_000
 
 # NYC bounding box (approximate)
 NYC_BBOX = {
-    'min_lon': -74.25909,
-    'max_lon': -73.70018,
-    'min_lat': 40.477399,
-    'max_lat': 40.917577
+    'min_lon': np.float32(-74.25909),
+    'max_lon': np.float32(-73.70018),
+    'min_lat': np.float32(40.477399),
+    'max_lat': np.float32(40.917577)
 }
 
 
-# ========== MAIN FUNCTION ========== #
+# ========== HELPERS ========== #
 
-def main():
-    print("Loading NYC Taxi data...")
-    taxi_df = pd.read_csv(
+def convert_to_parquet():
+    """Convert the raw taxi CSV to Parquet once so later runs skip CSV parsing."""
+    if os.path.exists(TAXI_PARQUET_PATH):
+        return
+
+    print("Converting NYC Taxi CSV to Parquet...")
+    reader = pd.read_csv(
         TAXI_DATA_PATH,
-        usecols=[
-            'pickup_longitude', 'pickup_latitude',
-            'dropoff_longitude', 'dropoff_latitude',
-            'tpep_pickup_datetime', 'tpep_dropoff_datetime'
-        ],
-        parse_dates=['tpep_pickup_datetime', 'tpep_dropoff_datetime']
+        usecols=TAXI_COLUMNS,
+        dtype=COORD_DTYPES,
+        parse_dates=DATE_COLUMNS,
+        chunksize=CHUNK_SIZE
     )
 
-    print(f"Initial rows: {len(taxi_df)}")
-
-    # Filter invalid coordinates
-    taxi_df = taxi_df[
-        (taxi_df['pickup_longitude'].between(NYC_BBOX['min_lon'], NYC_BBOX['max_lon'])) &
-        (taxi_df['pickup_latitude'].between(NYC_BBOX['min_lat'], NYC_BBOX['max_lat'])) &
-        (taxi_df['dropoff_longitude'].between(NYC_BBOX['min_lon'], NYC_BBOX['max_lon'])) &
-        (taxi_df['dropoff_latitude'].between(NYC_BBOX['min_lat'], NYC_BBOX['max_lat']))
-    ]
-
-    taxi_df = taxi_df.dropna(subset=[
-        'pickup_longitude', 'pickup_latitude',
-        'dropoff_longitude', 'dropoff_latitude'
-    ])
+    # Stream chunks to disk so the full CSV is never held in memory;
+    # write to a temporary file so an interrupted run is not mistaken for a finished one
+    tmp_path = TAXI_PARQUET_PATH + ".tmp"
+    writer = None
+    try:
+        for chunk in reader:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression='zstd')
+            writer.write_table(table.cast(writer.schema), row_group_size=CHUNK_SIZE)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, TAXI_PARQUET_PATH)
+
+
+def filter_trips(taxi_df):
+    """Keep trips inside the NYC bounding box with a reasonable duration."""
+    # Filter invalid coordinates (NaN fails every comparison, so missing coordinates drop too)
+    lon1 = taxi_df['pickup_longitude'].to_numpy()
+    lat1 = taxi_df['pickup_latitude'].to_numpy()
+    lon2 = taxi_df['dropoff_longitude'].to_numpy()
+    lat2 = taxi_df['dropoff_latitude'].to_numpy()
+    in_bbox = (
+        (lon1 >= NYC_BBOX['min_lon']) & (lon1 <= NYC_BBOX['max_lon']) &
+        (lat1 >= NYC_BBOX['min_lat']) & (lat1 <= NYC_BBOX['max_lat']) &
+        (lon2 >= NYC_BBOX['min_lon']) & (lon2 <= NYC_BBOX['max_lon']) &
+        (lat2 >= NYC_BBOX['min_lat']) & (lat2 <= NYC_BBOX['max_lat'])
+    )
+    taxi_df = taxi_df[in_bbox]
 
     # Calculate travel time in minutes
     taxi_df["travel_time"] = (
-        (taxi_df["tpep_dropoff_datetime"] - taxi_df["tpep_pickup_datetime"])
-        .dt.total_seconds() / 60.0
+        (taxi_df["tpep_dropoff_datetime"].to_numpy() - taxi_df["tpep_pickup_datetime"].to_numpy())
+        / np.timedelta64(1, 'm')
     )
 
     # Filter by reasonable trip durations
-    taxi_df = taxi_df[
+    return taxi_df[
         (taxi_df["travel_time"] >= 1) &
         (taxi_df["travel_time"] <= 300)
     ]
 
+# ========== MAIN FUNCTION ========== #
+
+def main():
+    convert_to_parquet()
+
+    print("Loading NYC Taxi data...")
+    taxi_file = pq.ParquetFile(TAXI_PARQUET_PATH)
+    print(f"Initial rows: {taxi_file.metadata.num_rows}")
+
+    # Filter one batch at a time so only surviving trips stay in memory
+    filtered_chunks = [
+        filter_trips(batch.to_pandas())
+        for batch in taxi_file.iter_batches(batch_size=CHUNK_SIZE, columns=TAXI_COLUMNS)
+    ]
+    taxi_df = pd.concat(filtered_chunks, ignore_index=True)
+    del filtered_chunks
+
     print(f"Filtered rows: {len(taxi_df)}")
 
     # Add unique event ID
-    taxi_df['event_id'] = range(len(taxi_df))
+    taxi_df['event_id'] = np.arange(len(taxi_df))
 
     # Load NYC census blocks shapefile
     print("Loading NYC census blocks...")
-    blocks = gpd.read_file(BLOCKS_SHP_PATH).to_crs(epsg=4326)
+    blocks = gpd.read_file(BLOCKS_SHP_PATH, engine='pyogrio', use_arrow=True).to_crs(epsg=4326)
 
-    # Create GeoDataFrames for pickup and dropoff points
-    pickup_gdf = gpd.GeoDataFrame(
-        taxi_df[['event_id', 'pickup_longitude', 'pickup_latitude', 'tpep_pickup_datetime']],
-        geometry=gpd.points_from_xy(taxi_df['pickup_longitude'], taxi_df['pickup_latitude']),
-        crs="EPSG:4326"
+    # Query pickup and dropoff points against the block index in one batch
+    print("Performing spatial joins...")
+    n_trips = len(taxi_df)
+    points = gpd.points_from_xy(
+        np.concatenate([taxi_df['pickup_longitude'].to_numpy(), taxi_df['dropoff_longitude'].to_numpy()]),
+        np.concatenate([taxi_df['pickup_latitude'].to_numpy(), taxi_df['dropoff_latitude'].to_numpy()])
     )
+    point_idx, block_idx = blocks.sindex.query(points, predicate='within')
 
-    dropoff_gdf = gpd.GeoDataFrame(
-        taxi_df[['event_id', 'dropoff_longitude', 'dropoff_latitude', 'tpep_dropoff_datetime']],
-        geometry=gpd.points_from_xy(taxi_df['dropoff_longitude'], taxi_df['dropoff_latitude']),
-        crs="EPSG:4326"
-    )
+    # Block position for every point (-1 when it falls outside all blocks)
+    point_block = np.full(2 * n_trips, -1)
+    point_block[point_idx] = block_idx
 
-    # Spatial join with census blocks
-    print("Performing spatial joins...")
-    pickup_blocks = gpd.sjoin(pickup_gdf, blocks, how='left', predicate='within')
-    dropoff_blocks = gpd.sjoin(dropoff_gdf, blocks, how='left', predicate='within')
+    # Block attributes by position; reindexing with -1 yields an all-NaN row like a left sjoin
+    block_attrs = blocks.drop(columns='geometry').reset_index(names='index_right')
+    block_attrs.index = np.arange(len(block_attrs))
 
-    # Drop geometry columns before saving to CSV
-    pickup_blocks = pickup_blocks.drop(columns='geometry')
-    dropoff_blocks = dropoff_blocks.drop(columns='geometry')
+    pickup_blocks = pd.concat([
+        taxi_df[['event_id', 'pickup_longitude', 'pickup_latitude', 'tpep_pickup_datetime']],
+        block_attrs.reindex(point_block[:n_trips]).reset_index(drop=True)
+    ], axis=1)
+
+    dropoff_blocks = pd.concat([
+        taxi_df[['event_id', 'dropoff_longitude', 'dropoff_latitude', 'tpep_dropoff_datetime']],
+        block_attrs.reindex(point_block[n_trips:]).reset_index(drop=True)
+    ], axis=1)
 
-    # Save sample (or full if small) output
+    # Save Parquet for the analysis scripts and CSV for the block visualization
+    pickup_blocks.to_parquet(PICKUP_PARQUET, index=False)
+    dropoff_blocks.to_parquet(DROPOFF_PARQUET, index=False)
     pickup_blocks.to_csv(PICKUP_OUTPUT, index=False)
     dropoff_blocks.to_csv(DROPOFF_OUTPUT, index=False)
 
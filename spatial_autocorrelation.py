@@ -11,10 +11,13 @@ Date: 2025-03-21
 """
 
 import os
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import esda
-from libpysal.weights import DistanceBand
+from libpysal.weights import WSP
+from scipy import sparse
+from scipy.spatial import cKDTree
 import matplotlib.pyplot as plt
 
 
@@ -22,8 +25,8 @@ import matplotlib.pyplot as plt
 
 # Input file paths
 BLOCKS_SHP = "data/nycb2010_25a/nycb2010.shp"
-PICKUP_CSV = "data/pickup_blocks_sample.csv"
-DROPOFF_CSV = "data/dropoff_blocks_sample.csv"
+PICKUP_PARQUET = "data/pickup_blocks.parquet"
+DROPOFF_PARQUET = "data/dropoff_blocks.parquet"
 
 # Output file paths
 CLUSTER_MAP_PNG = "output/local_morans_i_clusters.png"
@@ -34,17 +37,14 @@ CLUSTER_MAP_PNG = "output/local_morans_i_clusters.png"
 def load_data():
     """Load spatial and taxi data."""
     print("Loading shapefile and taxi block data...")
-    blocks = gpd.read_file(BLOCKS_SHP)
-    pickup_blocks = pd.read_csv(PICKUP_CSV)
-    dropoff_blocks = pd.read_csv(DROPOFF_CSV)
+    blocks = gpd.read_file(BLOCKS_SHP, engine='pyogrio', use_arrow=True, where="BoroName = 'Manhattan'")
+    pickup_blocks = pd.read_parquet(PICKUP_PARQUET, columns=['BCTCB2010'])
+    dropoff_blocks = pd.read_parquet(DROPOFF_PARQUET, columns=['BCTCB2010'])
     return blocks, pickup_blocks, dropoff_blocks
 
 
 def preprocess_data(blocks, pickup_blocks, dropoff_blocks):
     """Aggregate taxi trips and merge with census blocks."""
-    # Filter to Manhattan blocks only
-    manhattan_blocks = blocks[blocks['BoroName'] == 'Manhattan'].copy()
-
     # Count pickups and dropoffs per census block
     pickup_counts = pickup_blocks.groupby("BCTCB2010").size().reset_index(name="trip_count_pickup")
     dropoff_counts = dropoff_blocks.groupby("BCTCB2010").size().reset_index(name="trip_count_dropoff")
@@ -57,14 +57,10 @@ def preprocess_data(blocks, pickup_blocks, dropoff_blocks):
     # Calculate total connections
     block_connections["total_connections"] = block_connections["trip_count_pickup"] + block_connections["trip_count_dropoff"]
 
-    # Fix BCTCB2010 as string for merging
-    def fix_block_id(x):
-        if isinstance(x, float) and x.is_integer():
-            return str(int(x))
-        return str(x).strip()
-
-    manhattan_blocks['BCTCB2010'] = manhattan_blocks['BCTCB2010'].apply(fix_block_id)
-    block_connections['BCTCB2010'] = block_connections['BCTCB2010'].apply(fix_block_id)
+    # Fix BCTCB2010 as string for merging (blocks are filtered to Manhattan when the shapefile is read;
+    # assign builds a new frame so the caller's blocks are left untouched)
+    manhattan_blocks = blocks.assign(BCTCB2010=blocks['BCTCB2010'].astype('string').str.strip())
+    block_connections['BCTCB2010'] = block_connections['BCTCB2010'].astype('string').str.strip()
 
     # Merge counts with spatial data
     manhattan_overall = manhattan_blocks.merge(block_connections, on='BCTCB2010', how='left').fillna({'total_connections': 0})
@@ -78,15 +74,22 @@ def spatial_autocorrelation_analysis(manhattan_overall, threshold=1000):
     # Reproject to NYC State Plane (meters)
     manhattan_overall = manhattan_overall.to_crs(epsg=2263)
 
-    # Create spatial weights matrix (distance band within threshold meters)
-    w = DistanceBand.from_dataframe(manhattan_overall, threshold=threshold, binary=True, silence_warnings=True)
-
-    # Identify and remove islands (no neighbors)
-    islands = [i for i, neighbors in w.neighbors.items() if len(neighbors) == 0]
-    manhattan_filtered = manhattan_overall.drop(index=islands)
-
-    # Recalculate weights for filtered data
-    w_filtered = DistanceBand.from_dataframe(manhattan_filtered, threshold=threshold, binary=True, silence_warnings=True)
+    # Create spatial weights matrix (binary distance band between block centroids within threshold)
+    centroids = manhattan_overall.geometry.centroid
+    pairs = cKDTree(np.column_stack([centroids.x, centroids.y])).query_pairs(r=threshold, output_type='ndarray')
+    n_blocks = len(manhattan_overall)
+    adjacency = sparse.coo_matrix(
+        (np.ones(2 * len(pairs)), (np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]]))),
+        shape=(n_blocks, n_blocks)
+    ).tocsr()
+
+    # Identify and remove islands (no neighbors); removing them leaves other neighborhoods
+    # unchanged, so the filtered weights are a slice rather than a rebuild
+    has_neighbors = adjacency.getnnz(axis=1) > 0
+    manhattan_filtered = manhattan_overall[has_neighbors].copy()
+    w_filtered = WSP(
+        adjacency[has_neighbors][:, has_neighbors], id_order=manhattan_filtered.index.tolist()
+    ).to_W(silence_warnings=True)
 
     # Get variable for analysis
     y = manhattan_filtered['total_connections'].values
@@ -104,16 +107,17 @@ def spatial_autocorrelation_analysis(manhattan_overall, threshold=1000):
     print(f"Global Moran's I p-value: {moran_global.p_sim:.4f}")
 
     # Cluster classification based on Local Moran's I
-    def classify_cluster(row):
-        if row['p_value'] < 0.05:
-            if row['local_moran'] > 0:
-                return 'High-High' if row['total_connections'] > y.mean() else 'Low-Low'
-            else:
-                return 'Low-High' if row['total_connections'] > y.mean() else 'High-Low'
-        else:
-            return 'Not Significant'
-
-    manhattan_filtered['cluster_type'] = manhattan_filtered.apply(classify_cluster, axis=1)
+    significant = moran_local.p_sim < 0.05
+    positive = moran_local.Is > 0
+    high = y > y.mean()
+
+    cluster_type = np.full(len(y), 'Not Significant', dtype=object)
+    cluster_type[significant & positive & high] = 'High-High'
+    cluster_type[significant & positive & ~high] = 'Low-Low'
+    cluster_type[significant & ~positive & high] = 'Low-High'
+    cluster_type[significant & ~positive & ~high] = 'High-Low'
+
+    manhattan_filtered['cluster_type'] = cluster_type
 
     return manhattan_filtered
 
@@ -8,11 +8,16 @@ Author: eknar31
 Date: 2025-03-21
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import folium
 from branca.colormap import linear
 
+from cache_utils import CACHE_DIR, cache_path, remove_stale
+
 # ========== CONFIGURATION ========== #
 
 BLOCKS_SHP = "data/nycb2010_25a/nycb2010.shp" 
@@ -21,46 +26,113 @@ DROPOFF_CSV = "data/dropoff_blocks.csv"
 
 OUTPUT_MAP = "output/Manhattan_Block_Connections.html" 
 OUTPUT_CSV = "output/manhattan_blocks_aggregated.csv" 
-OUTPUT_SHP = "output/manhattan_blocks_aggregated.shp"
+OUTPUT_PARQUET = "output/manhattan_blocks_aggregated.parquet"
 
 MAP_CENTER = [40.7831, -73.9712]
 
+# Trip rows counted at a time
+CHUNK_SIZE = 1_000_000
+
+# Simplification tolerance for the map polygons (degrees, ~1 m here)
+SIMPLIFY_TOLERANCE = 1e-5
+
 # ========== HELPERS ========== #
 
-def get_color(value, colormap):
-    """Return color from colormap."""
-    return colormap(value)
+def load_manhattan_blocks():
+    """Load Manhattan blocks in EPSG:4326, reusing the GeoParquet cache when the shapefile is unchanged."""
+    blocks_cache = cache_path("manhattan_blocks", BLOCKS_SHP)
+    if os.path.exists(blocks_cache):
+        return gpd.read_parquet(blocks_cache)
+
+    manhattan_blocks = gpd.read_file(
+        BLOCKS_SHP,
+        engine="pyogrio",
+        where="BoroName = 'Manhattan'",
+        columns=["BCTCB2010", "BoroName"]
+    ).to_crs(epsg=4326)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    manhattan_blocks.to_parquet(blocks_cache)
+    remove_stale("manhattan_blocks", BLOCKS_SHP)
+    return manhattan_blocks
+
+def normalize_block_id(block_ids):
+    """Return block IDs as integer strings (missing IDs become "0")."""
+    return pd.to_numeric(block_ids, errors="coerce").fillna(0).astype("int64").astype("string")
+
+def count_blocks(path):
+    """Count trips per block ID in a pickup/dropoff CSV, streaming it in chunks."""
+    counts = pd.Series(dtype="int64[pyarrow]")
+    reader = pd.read_csv(
+        path,
+        usecols=["BCTCB2010"],
+        dtype={"BCTCB2010": "float64"},
+        dtype_backend="pyarrow",
+        chunksize=CHUNK_SIZE
+    )
+    for chunk in reader:
+        # count on integer IDs; only the unique IDs are converted to strings below
+        chunk_counts = chunk["BCTCB2010"].fillna(0).astype("int64[pyarrow]").value_counts()
+        counts = counts.add(chunk_counts, fill_value=0)
+
+    counts = counts.astype("int64[pyarrow]")
+    counts.index = counts.index.astype("string[pyarrow]").rename("BCTCB2010")
+    return counts
+
+def map_colors(values, colormap):
+    """Return "#RRGGBBAA" colors for values, interpolating the colormap stops like branca does."""
+    stops = np.asarray(colormap.index, dtype=np.float64)
+    stop_colors = np.asarray(colormap.colors, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    # Interpolate between the flanking stops; values outside the scale take the end colors
+    upper = np.clip(np.searchsorted(stops, values), 1, len(stops) - 1)
+    width = stops[upper] - stops[upper - 1]
+    p = np.divide(values - stops[upper - 1], width, out=np.ones_like(values), where=width > 0)
+    above, below = values >= stops[-1], values <= stops[0]
+    upper[above], p[above] = len(stops) - 1, 1.0
+    upper[below], p[below] = 1, 0.0
+    rgba = (1.0 - p)[:, None] * stop_colors[upper - 1] + p[:, None] * stop_colors[upper]
+
+    # Format as hex through a byte -> "xx" table
+    rgba_bytes = (rgba * 255.9999).astype(np.int64)
+    hex_bytes = np.array([f"{b:02x}" for b in range(256)])
+    colors = np.full(len(values), "#")
+    for channel in range(4):
+        colors = np.char.add(colors, hex_bytes[rgba_bytes[:, channel]])
+    return colors
 
 # ========== MAIN FUNCTION ========== #
 
 def main():
-    # Load Shapefile and Taxi Data
-    blocks = gpd.read_file(BLOCKS_SHP).to_crs(epsg=4326)
-    manhattan_blocks = blocks[blocks['BoroName'] == 'Manhattan'].copy()
-    
-    pickup_blocks = pd.read_csv(PICKUP_CSV)
-    dropoff_blocks = pd.read_csv(DROPOFF_CSV)
-    pickup_blocks["BCTCB2010"] = pickup_blocks["BCTCB2010"].fillna(0).apply(lambda x: str(int(float(x))) if pd.notnull(x) else "")
-    dropoff_blocks["BCTCB2010"] = dropoff_blocks["BCTCB2010"].fillna(0).apply(lambda x: str(int(float(x))) if pd.notnull(x) else "")
-
-    # group by block to get trip count
-    pickup_counts = pickup_blocks.groupby("BCTCB2010").size().reset_index(name="trip_count")
-    dropoff_counts = dropoff_blocks.groupby("BCTCB2010").size().reset_index(name="trip_count")
-
-    # merge pickup_counts and dropoff_counts to get it all in one df
-    block_connections = pd.merge(
-        pickup_counts, dropoff_counts, on="BCTCB2010", how="outer", suffixes=("_pickup", "_dropoff")
-    ).fillna(0)
-
-    # assign "total_connections" with the total pickups and dropoffs in each block
-    block_connections["total_connections"] = block_connections["trip_count_pickup"] + block_connections["trip_count_dropoff"]
+    # Load Shapefile and Taxi Data (the three reads are independent, so overlap them)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        blocks_future = executor.submit(load_manhattan_blocks)
+        pickup_future = executor.submit(count_blocks, PICKUP_CSV)
+        dropoff_future = executor.submit(count_blocks, DROPOFF_CSV)
+
+        manhattan_blocks = blocks_future.result()
+        pickup_counts = pickup_future.result()
+        dropoff_counts = dropoff_future.result()
+
+    # add pickups and dropoffs aligned on block ID
+    block_connections = (
+        pickup_counts.add(dropoff_counts, fill_value=0)
+        .rename("total_connections")
+        .reset_index()
+        .convert_dtypes(dtype_backend="pyarrow")
+    )
+    del pickup_counts, dropoff_counts
 
     # Since there was an issue with line spacing and float numbers, make sure they are of the same type
-    manhattan_blocks['BCTCB2010'] = manhattan_blocks['BCTCB2010'].apply(lambda x: str(int(x)) if isinstance(x, float) and x.is_integer() else str(x)).str.strip()
-    block_connections['BCTCB2010'] = block_connections['BCTCB2010'].apply(lambda x: str(int(float(x))) if isinstance(x, float) and float(x).is_integer() else str(x)).str.strip()
+    # (block_connections keys are already integer strings from count_blocks)
+    manhattan_blocks['BCTCB2010'] = normalize_block_id(manhattan_blocks['BCTCB2010'])
 
-    # merge manhattan blocks with the block_connections
-    manhattan_blocks = manhattan_blocks.merge(block_connections, on='BCTCB2010', how='left').fillna({'total_connections': 0})
+    # look up each manhattan block's connections (block IDs are unique, blocks without trips get 0)
+    connections = block_connections.set_index('BCTCB2010')['total_connections']
+    manhattan_blocks['total_connections'] = (
+        connections.reindex(manhattan_blocks['BCTCB2010'].to_numpy(), fill_value=0).astype('int32').to_numpy()
+    )
 
     # Creating Map 
     m = folium.Map(location=MAP_CENTER, zoom_start=12)
@@ -73,25 +145,33 @@ def main():
     colormap.caption = 'Number of Connections'
     colormap.add_to(m)
 
-    # Add block polygons with color based on number of connections
-    for _, row in manhattan_blocks.iterrows():
-        color = get_color(row['total_connections'], colormap)
-        folium.GeoJson(
-            row['geometry'],
-            style_function=lambda feature, color=color: {
-                'fillColor': color, 'color': 'black', 'weight': 0.5, 'fillOpacity': 0.6
-            },
-            tooltip=folium.Tooltip(f"Block: {row['BCTCB2010']}<br>Connections: {int(row['total_connections'])}")
-        ).add_to(m)
+    # Add all block polygons as one layer, colored by number of connections
+    map_blocks = manhattan_blocks[['BCTCB2010', 'total_connections', 'geometry']].copy()
+    # (only the map copy is simplified; exports keep the full geometry)
+    map_blocks['geometry'] = map_blocks.geometry.simplify(SIMPLIFY_TOLERANCE, preserve_topology=True)
+    map_blocks['color'] = map_colors(map_blocks['total_connections'], colormap)
+    map_blocks['tooltip'] = (
+        "Block: " + map_blocks['BCTCB2010'].astype(str)
+        + "<br>Connections: " + map_blocks['total_connections'].astype('int32').astype(str)
+    )
+    folium.GeoJson(
+        map_blocks,
+        style_function=lambda feature: {
+            'fillColor': feature['properties']['color'], 'color': 'black', 'weight': 0.5, 'fillOpacity': 0.6
+        },
+        tooltip=folium.GeoJsonTooltip(fields=['tooltip'], labels=False)
+    ).add_to(m)
 
     # Save map to HTML
-    m.save(OUTPUT_MAP)
+    html = m.get_root().render()
+    with open(OUTPUT_MAP, 'w', buffering=1024 * 1024, encoding='utf-8') as f:
+        f.write(html)
     print("Visualization saved as Manhattan_Block_Connections.html")
 
-    # Save CSV and SHP
+    # Save CSV and GeoParquet
     manhattan_blocks.drop(columns=['geometry']).to_csv(OUTPUT_CSV, index=False)
-    manhattan_blocks.to_file(OUTPUT_SHP)
-    print("Manhattan_blocks saved as csv and shape files")
+    manhattan_blocks.to_parquet(OUTPUT_PARQUET)
+    print("Manhattan_blocks saved as csv and GeoParquet files")
     print('Code all completed!')
 
 # ========== MAIN ========== #